@@ -1,5 +1,10 @@
+import hashlib
+import os
+import pickle
+
 import streamlit as st
 import pandas as pd
+import numpy as np
 from ortools.sat.python import cp_model
 
 # ───────────────────────── FIXED PARAMETERS ─────────────────────────
@@ -7,11 +12,52 @@ DAYS = 7
 HOURS_PER_DAY = 14  # 10:00 -> 23:00 (14 hours)
 START_HOUR = 10
 ROLES = ["Cuisinier", "Pizzaiolo", "Plongeur"]
+EMP_COLUMNS = ["Nom", *ROLES, "Heures Max", "Coupures Max"]
 
 # Generate labels for UI display
 hour_labels = [f"{(START_HOUR + h) % 24}:00" for h in range(HOURS_PER_DAY)]
 day_names = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
 
+
+@st.cache_data
+def default_needs():
+    """Generates a default staffing needs dictionary."""
+    needs = {}
+    for role in ROLES:
+        daily = []
+        for h in range(HOURS_PER_DAY):
+            # Peak hours: 10:00-15:00 and 18:00-22:00
+            if 0 <= h <= 5 or 8 <= h <= 12:
+                need = 1
+            # Off-peak: 16:00-18:00 (only cook needed)
+            elif 6 <= h <= 7:
+                need = 1 if role == "Cuisinier" else 0
+            else:
+                need = 0
+            daily.append(need)
+        needs[role] = {d: daily.copy() for d in day_names}
+    return needs
+
+
+def default_employees(start, stop):
+    """Default rows for employees start..stop-1, indexed by their position."""
+    count = stop - start
+    return pd.DataFrame({
+        "Nom": [f"Emp{i+1}" for i in range(start, stop)],
+        "Cuisinier": [True] * count, # Default to True for easier setup
+        "Pizzaiolo": [True] * count,
+        "Plongeur": [True] * count,
+        "Heures Max": [42] * count,
+        "Coupures Max": [3] * count,
+    }, index=range(start, stop))
+
+
+@st.cache_data
+def needs_table(role_needs_items):
+    """Hours x days table of one role's needs, rebuilt only when those needs change."""
+    return pd.DataFrame(dict(role_needs_items), index=hour_labels)
+
+
 # --- Streamlit UI Configuration ---
 st.set_page_config(page_title="Planning Cuisine", layout="wide")
 st.title("👨‍🍳 Optimized Kitchen Scheduler")
@@ -22,16 +68,16 @@ with st.form(key="schedule_form"):
     num_workers = st.slider("Number of employees", 2, 12, 6)
 
     # ────────── Employee Skills Table ──────────
-    # Initialize or update the employee dataframe based on the slider
-    if "kitchen_df" not in st.session_state or st.session_state.kitchen_df.shape[0] != num_workers:
-        st.session_state.kitchen_df = pd.DataFrame({
-            "Nom": [f"Emp{i+1}" for i in range(num_workers)],
-            "Cuisinier": [True] * num_workers, # Default to True for easier setup
-            "Pizzaiolo": [True] * num_workers,
-            "Plongeur": [True] * num_workers,
-            "Heures Max": [42] * num_workers,
-            "Coupures Max": [3] * num_workers,
-        })
+    # Initialize or resize the employee dataframe based on the slider
+    if "kitchen_df" not in st.session_state:
+        st.session_state.kitchen_df = default_employees(0, num_workers)
+    elif st.session_state.kitchen_df.shape[0] != num_workers:
+        # Keep the rows already edited: drop the extra ones, or only add defaults for the new ones
+        current = st.session_state.kitchen_df.reset_index(drop=True)
+        if len(current) > num_workers:
+            st.session_state.kitchen_df = current.iloc[:num_workers]
+        else:
+            st.session_state.kitchen_df = pd.concat([current, default_employees(len(current), num_workers)])
 
     st.subheader("💼 Employee Skills & Constraints")
     # Use the data editor for interactive input
@@ -39,25 +85,6 @@ with st.form(key="schedule_form"):
         st.session_state.kitchen_df, num_rows="dynamic", key="kitchen_editor")
     
     # ────────── Hourly Needs Table ──────────
-
-    def default_needs():
-        """Generates a default staffing needs dictionary."""
-        needs = {}
-        for role in ROLES:
-            daily = []
-            for h in range(HOURS_PER_DAY):
-                # Peak hours: 10:00-15:00 and 18:00-22:00
-                if 0 <= h <= 5 or 8 <= h <= 12:
-                    need = 1
-                # Off-peak: 16:00-18:00 (only cook needed)
-                elif 6 <= h <= 7:
-                    need = 1 if role == "Cuisinier" else 0
-                else:
-                    need = 0
-                daily.append(need)
-            needs[role] = {d: daily.copy() for d in day_names}
-        return needs
-
     # Initialize needs in session state if not present
     if "role_needs" not in st.session_state:
         st.session_state.role_needs = default_needs()
@@ -66,187 +93,323 @@ with st.form(key="schedule_form"):
     edited_role_needs = {}
     for role in ROLES:
         st.markdown(f"### {role}")
-        df_role = pd.DataFrame(st.session_state.role_needs[role], index=hour_labels)
+        needs_items = tuple((d, tuple(st.session_state.role_needs[role][d])) for d in day_names)
+        df_role = needs_table(needs_items)
         edited_df_role = st.data_editor(df_role, key=f"needs_{role}")
         edited_role_needs[role] = {d: edited_df_role[d].tolist() for d in day_names}
 
+    # Solver tuning for the Boolean-heavy model, kept as an option to compare both settings
+    fast_mode = st.checkbox("Fast mode", help="Skip the LP relaxation and most of the probing in CP-SAT")
+
     # --- The submit button for the form ---
     submitted = st.form_submit_button("✅ Generate Kitchen Schedule")
 
 
-# ───────────────────────── Schedule Generation (runs only on submission) ─────────────────────────
-if submitted:
-    # Update session state with the edited data after submission
-    st.session_state.kitchen_df = edited_df
-    st.session_state.role_needs = edited_role_needs
-    df_emp = st.session_state.kitchen_df.fillna(False)
-    role_needs = st.session_state.role_needs
+# ───────────────────────── Schedule Generation (cached on the submitted inputs) ─────────────────────────
+def add_lex_leq(model, xs, ys):
+    """Constrains the Boolean vector xs to be lexicographically <= ys.
+
+    eq_i is forced true while xs[:i] == ys[:i], and xs[i] <= ys[i] must hold wherever it is.
+    """
+    eq = None  # The empty prefix is always equal
+    for i, (x, y) in enumerate(zip(xs, ys)):
+        prefix_differs = [] if eq is None else [eq.Not()]
+        model.AddBoolOr(prefix_differs + [x.Not(), y])
+        if i + 1 < len(xs):
+            eq = model.NewBoolVar("")
+            # An equal prefix stays equal unless x_i=0, y_i=1 (x_i=1, y_i=0 is excluded above)
+            model.AddBoolOr(prefix_differs + [x.Not(), eq])
+            model.AddBoolOr(prefix_differs + [y, eq])
+
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def build_model(emp_tuple, needs_tuple) -> tuple[cp_model.CpModel, np.ndarray]:
+    """Builds the CP-SAT model; returns it with the proto indices of the shift literals.
+
+    The model is kept as a live resource (it cannot be pickled) and is shared read-only:
+    solving never modifies it, so any solve on the same employees and needs reuses it.
+    """
+    df_emp = pd.DataFrame(list(emp_tuple), columns=EMP_COLUMNS)
+    role_needs = {r: {d: list(hours) for d, hours in days} for r, days in needs_tuple}
 
     model = cp_model.CpModel()
-    idx = lambda d, h: d * HOURS_PER_DAY + h  # Helper to flatten day/hour index
     SLOTS = DAYS * HOURS_PER_DAY
+    # Time slots of each day (slot = d * HOURS_PER_DAY + h), precomputed as plain ints: the
+    # build indexes by slot thousands of times and a lookup here is cheaper than a function call
+    day_slots = [range(d * HOURS_PER_DAY, (d + 1) * HOURS_PER_DAY) for d in range(DAYS)]
+    day_slice = [slice(hours.start, hours.stop) for hours in day_slots]
     W = len(df_emp)
+    # Column arrays read once, so the loops below never go through the pandas indexers
+    skills = {r: df_emp[r].astype(bool).to_numpy() for r in ROLES}
+    heures_max = df_emp['Heures Max'].astype(int).to_numpy()
+    coup_max = df_emp['Coupures Max'].astype(int).to_numpy()
+    # Workers that can hold each role: the only ones with shift variables for it
+    candidates = {r: np.flatnonzero(skills[r]).tolist() for r in ROLES}
+
+    # Coverage pins every shift of a role to 0 wherever that role has no demand, so those
+    # shifts all share one constant instead of getting variables. Slots without any demand
+    # are left out of the per-slot constraints and of the sums below.
+    ZERO = model.NewConstant(0)
+    demand = {(r, t): need for r in ROLES for d in range(DAYS)
+              for t, need in zip(day_slots[d], role_needs[r][day_names[d]])}
+    active_slots = [t for t in range(SLOTS) if any(demand[(r, t)] for r in ROLES)]
 
     # --- Variable Definitions ---
-    # shifts[(w,r)][t] is true if worker w performs role r at time slot t
-    shifts = {(w, r): [model.NewBoolVar(f"w{w}_{r}_{t}") for t in range(SLOTS)]
-              for w in range(W) for r in ROLES}
+    # shifts[(w,r)][t] is true if worker w performs role r at time slot t. Roles the
+    # employee lacks the skill for are never allocated: they use the shared zero as well.
+    shifts = {}
+    for w in range(W):
+        for r in ROLES:
+            skilled = skills[r][w]
+            shifts[(w, r)] = [model.NewBoolVar("") if skilled and demand[(r, t)] else ZERO
+                              for t in range(SLOTS)]
+    # Flat views shared by the per-day and per-week sums: the role lists of each worker,
+    # and the real (non-constant) shift literals of each worker and day
+    shifts_wr = [[shifts[(w, r)] for r in ROLES] for w in range(W)]
+    day_lits = [[[v for slots in shifts_wr[w] for v in slots[day_slice[d]] if v is not ZERO]
+                 for d in range(DAYS)] for w in range(W)]
+
+    # works[w][t] is true if worker w holds any role at time slot t: the OR of its role
+    # literals, or that literal itself when only one role is possible
+    works = {}
+    for w in range(W):
+        works[w] = [ZERO] * SLOTS
+        for t in active_slots:
+            lits = [slots[t] for slots in shifts_wr[w] if slots[t] is not ZERO]
+            if len(lits) == 1:
+                works[w][t] = lits[0]
+            elif lits:
+                any_role = model.NewBoolVar("")
+                model.AddBoolOr(lits).OnlyEnforceIf(any_role)
+                model.AddBoolAnd([v.Not() for v in lits]).OnlyEnforceIf(any_role.Not())
+                works[w][t] = any_role
 
     # is_off[w][d] is true if worker w is off on day d
     is_off = {w: [] for w in range(W)}
     for w in range(W):
         for d in range(DAYS):
-            off = model.NewBoolVar(f"off_{w}_{d}")
-            total_day = sum(shifts[(w, r)][idx(d, h)] for r in ROLES for h in range(HOURS_PER_DAY))
+            off = model.NewBoolVar("")
             # Link the 'off' variable to the daily work hours
-            model.Add(total_day == 0).OnlyEnforceIf(off)
-            model.Add(total_day >= 3).OnlyEnforceIf(off.Not())  # If working, must work at least 3 hours
+            model.AddBoolAnd([v.Not() for v in day_lits[w][d]]).OnlyEnforceIf(off)
+            # If working, must work between 3 and 10 hours (a single bounded row)
+            model.AddLinearConstraint(cp_model.LinearExpr.Sum(day_lits[w][d]), 3, 10).OnlyEnforceIf(off.Not())
             is_off[w].append(off)
 
     # --- General Constraints ---
     # ▸ A worker can perform at most one role per hour
     for w in range(W):
-        for t in range(SLOTS):
-            model.Add(sum(shifts[(w, r)][t] for r in ROLES) <= 1)
+        for t in active_slots:
+            hour_shifts = [shifts[(w, r)][t] for r in ROLES if shifts[(w, r)][t] is not ZERO]
+            if len(hour_shifts) > 1:
+                model.AddAtMostOne(hour_shifts)
 
     # ▸ A worker cannot change roles within the same day
+    # One clause per pair of roles and pair of consecutive hours: role r1 at hour h excludes
+    # any other role r2 at h + 1 (pairs where either shift is the zero constant are skipped)
+    role_pairs = [(r1, r2) for r1 in ROLES for r2 in ROLES if r1 != r2]
     for w in range(W):
         for d in range(DAYS):
-            for h in range(HOURS_PER_DAY - 1):
-                t = idx(d, h)
-                t1 = idx(d, h + 1)
-                for r1 in ROLES:
-                    for r2 in ROLES:
-                        if r1 != r2:
-                            # Prohibit switching from r1 at hour h to r2 at hour h+1
-                            model.Add(shifts[(w, r1)][t] + shifts[(w, r2)][t1] <= 1)
-
-    # ▸ Daily hour limits, work block rules, and break counting
+            for t in day_slots[d][:-1]:
+                for r1, r2 in role_pairs:
+                    before, after = shifts[(w, r1)][t], shifts[(w, r2)][t + 1]
+                    if before is not ZERO and after is not ZERO:
+                        model.AddBoolOr([before.Not(), after.Not()])
+
+    # ▸ Work block rules and break counting (daily hour limits are set with is_off above)
     for w in range(W):
-        max_coup = int(df_emp.iloc[w]['Coupures Max'])
         for d in range(DAYS):
-            total_day = sum(shifts[(w, r)][idx(d, h)] for r in ROLES for h in range(HOURS_PER_DAY))
-            model.Add(total_day <= 10)  # Max 10 hours per day
-
             # Detect the start of a work block to count breaks ('coupures')
-            starts = []
+            # Each rule is one clause "on at h and off at h-1 => ...": a start forces the next
+            # two hours on, and each start literal is only implied, never reified.
+            on = works[w][day_slice[d]]
+            starts = [on[0]]  # A start at the first hour of the day is just working then
             for h in range(HOURS_PER_DAY):
-                t = idx(d, h)
-                curr = sum(shifts[(w, r)][t] for r in ROLES)
-                start = model.NewBoolVar(f'start_{w}_{d}_{h}')
-
-                if h == 0:
-                    # A start at the first hour of the day only depends on current work status
-                    model.Add(curr == 1).OnlyEnforceIf(start)
-                    model.Add(curr != 1).OnlyEnforceIf(start.Not())
-                else:
-                    prev = sum(shifts[(w, r)][idx(d, h - 1)] for r in ROLES)
-                    # A "start" is a transition from not working (prev=0) to working (curr=1).
-                    model.Add(curr - prev == 1).OnlyEnforceIf(start)
-                    model.Add(curr - prev != 1).OnlyEnforceIf(start.Not())
-
-                # If a block starts, it must be at least 3 hours long
+                if on[h] is ZERO:
+                    continue
+                began = [on[h].Not()] + ([on[h - 1]] if h and on[h - 1] is not ZERO else [])
                 if h <= HOURS_PER_DAY - 3:
-                    min_block_sum = sum(shifts[(w, r)][idx(d, hh)] for r in ROLES for hh in range(h, h + 3))
-                    model.Add(min_block_sum >= 3).OnlyEnforceIf(start)
+                    # If a block starts, it must be at least 3 hours long
+                    model.AddBoolOr(began + [on[h + 1]])
+                    model.AddBoolOr(began + [on[h + 2]])
+                    if h > 0:
+                        start = model.NewBoolVar("")
+                        model.AddBoolOr(began + [start])
+                        starts.append(start)
                 else:
                     # Cannot start a block if less than 3 hours remain in the day
-                    model.Add(start == 0)
-                starts.append(start)
-            
+                    model.AddBoolOr(began)
+
             # The number of starts is one more than the number of breaks
-            model.Add(sum(starts) <= max_coup + 1)
+            model.Add(cp_model.LinearExpr.Sum(starts) <= coup_max[w] + 1)
 
     # ▸ At least one block of two consecutive days off
+    # Automaton over the weekly OFF flags: 0 = last day worked, 1 = one day off just seen,
+    # 2 = two consecutive days off seen (absorbing, and the only accepting state)
+    two_off_transitions = [(0, 0, 0), (0, 1, 1), (1, 0, 0), (1, 1, 2), (2, 0, 2), (2, 1, 2)]
     for w in range(W):
-        cons = []
-        for d in range(DAYS - 1):
-            bloc = model.NewBoolVar(f"2off_{w}_{d}")
-            model.AddBoolAnd([is_off[w][d], is_off[w][d + 1]]).OnlyEnforceIf(bloc)
-            model.AddBoolOr([is_off[w][d].Not(), is_off[w][d + 1].Not()]).OnlyEnforceIf(bloc.Not())
-            cons.append(bloc)
-        model.Add(sum(cons) >= 1)
+        model.AddAutomaton(is_off[w], 0, [2], two_off_transitions)
 
     # ▸ Weekly maximum hours per employee
     for w in range(W):
-        total_hours = sum(shifts[(w, r)][t] for r in ROLES for t in range(SLOTS))
-        model.Add(total_hours <= int(df_emp.iloc[w]['Heures Max']))
-
-    # ▸ Employee must have the required skill for the assigned role
+        total_hours = cp_model.LinearExpr.Sum([v for lits in day_lits[w] for v in lits])
+        model.Add(total_hours <= heures_max[w])
+
+    # ▸ Break the symmetry between interchangeable employees
+    # Employees with the same skills and limits can swap schedules freely. Ordering their
+    # OFF-day patterns lexicographically prunes those permutations at only a few extra
+    # literals per pair (ordering the full shift vectors measured slower overall).
+    profiles = {}
     for w in range(W):
-        for r in ROLES:
-            if not bool(df_emp.iloc[w][r]):
-                for t in range(SLOTS):
-                    model.Add(shifts[(w, r)][t] == 0)
+        profile = (tuple(bool(skills[r][w]) for r in ROLES), heures_max[w], coup_max[w])
+        profiles.setdefault(profile, []).append(w)
+    for group in profiles.values():
+        for w1, w2 in zip(group, group[1:]):
+            add_lex_leq(model, is_off[w1], is_off[w2])
 
     # ▸ Meet the hourly staffing requirements for each role
-    for d in range(DAYS):
-        for h in range(HOURS_PER_DAY):
-            t = idx(d, h)
-            for r in ROLES:
-                req = role_needs[r][day_names[d]][h]
-                assigned = sum(shifts[(w, r)][t] for w in range(W))
-                model.Add(assigned == req)
+    for t in active_slots:
+        for r in ROLES:
+            if demand[(r, t)]:
+                assigned = cp_model.LinearExpr.Sum([shifts[(w, r)][t] for w in candidates[r]])
+                model.Add(assigned == demand[(r, t)])
 
     # --- Objective Function ---
-    # Minimize the total number of hours worked (while satisfying all constraints)
-    total_shifts = sum(shifts[(w, r)][t] for w in range(W) for r in ROLES for t in range(SLOTS))
-    model.Minimize(total_shifts)
+    # None: coverage fixes every role's head count to its demand, so the total number of
+    # hours worked is the same in every valid schedule. Minimizing it would only make CP-SAT
+    # prove a constant bound, so the model is solved for the first feasible schedule instead.
+
+    # Where each shift literal sits in the solution vector, in (worker, role, slot) order
+    # (-1 where the shift is the zero constant)
+    shift_index = np.array([-1 if v is ZERO else v.Index() for w in range(W) for r in ROLES for v in shifts[(w, r)]],
+                           dtype=np.int64).reshape(W, len(ROLES), SLOTS)
+    return model, shift_index
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def build_and_solve(emp_tuple, needs_tuple, fast_mode=False,
+                    _previous_roles=None) -> tuple[pd.DataFrame, pd.DataFrame, np.ndarray] | None:
+    """Solves the model of these inputs; returns the (planning, summary, role codes) results, or None.
+
+    Both inputs are nested tuples so Streamlit can hash them: re-submitting the same
+    employees and needs returns the previous schedule without solving again.
+    fast_mode switches CP-SAT to lighter settings (no LP relaxation, minimal probing).
+    _previous_roles, the (employee, day, hour) role codes of the last schedule, is returned
+    again if it still satisfies the model of these inputs. It is not part of the cache key.
+    """
+    model, shift_index = build_model(emp_tuple, needs_tuple)
+    W = len(emp_tuple)
+    names = [emp[0] for emp in emp_tuple]
+
+    # --- Reuse of the previous schedule ---
+    # After a small edit the last schedule often still satisfies every constraint. It is
+    # checked by fixing every shift to its value in that schedule, which presolve settles on
+    # its own: the derived literals follow from the shifts. When the check fails the model
+    # is solved from scratch, without a hint, as an invalid hint measured slower than none.
+    # The cached model is shared, so the hint goes on a copy.
+    solution = None
+    if _previous_roles is not None and _previous_roles.shape == (W, DAYS, HOURS_PER_DAY):
+        hinted = model.Clone()
+        held = _previous_roles.reshape(W, 1, -1) == np.arange(1, len(ROLES) + 1).reshape(1, -1, 1)
+        real = shift_index >= 0
+        hint = hinted.Proto().solution_hint
+        hint.vars.extend(shift_index[real].tolist())
+        hint.values.extend(held[real].astype(int).tolist())
+        check = cp_model.CpSolver()
+        check.parameters.fix_variables_to_their_hinted_value = True
+        check.parameters.num_workers = 1
+        check.parameters.max_time_in_seconds = 1.0
+        if check.Solve(hinted) in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            solution = np.array(check.ResponseProto().solution, dtype=np.int64)
 
     # ────────── Solve the Model ──────────
-    with st.spinner("Finding the optimal schedule..."):
+    if solution is None:
         solver = cp_model.CpSolver()
         solver.parameters.max_time_in_seconds = 20.0  # Set a timeout
+        # Run the full parallel portfolio (generic searches + LNS), which needs at least 8 workers
+        solver.parameters.num_workers = max(8, os.cpu_count() or 8)
+        # Fixed seed so that re-solving the same inputs (e.g. after a cache eviction) tends to
+        # give back the same schedule, and no search log on the server console
+        solver.parameters.random_seed = 1
+        solver.parameters.log_search_progress = False
+        if fast_mode:
+            # The model is pure Boolean clauses and small cardinality rows: the LP relaxation
+            # brings nothing to the search, so do not build it and keep probing light
+            solver.parameters.linearization_level = 0
+            solver.parameters.cp_model_probing_level = 1
         status = solver.Solve(model)
+        if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            return None
+        solution = np.array(solver.ResponseProto().solution, dtype=np.int64)
+
+    # Process the solution to create a readable schedule
+    # The whole solution vector was read in one call: pick every shift value out of it by
+    # proto index, turn them into hourly role codes (0 = off, i + 1 = ROLES[i]), then derive
+    # both tables with array operations
+    real = shift_index >= 0
+    held = np.where(real, solution[np.where(real, shift_index, 0)], 0)
+    role_codes = np.arange(1, len(ROLES) + 1).reshape(1, -1, 1)
+    roles = (held * role_codes).sum(axis=1).astype(np.int8).reshape(W, DAYS, HOURS_PER_DAY)
+    labels = np.array(["", *ROLES], dtype=object)[roles]
+    df_planning = pd.DataFrame(labels.reshape(W * DAYS, HOURS_PER_DAY), columns=hour_labels)
+    df_planning.insert(0, "Employé", np.repeat(np.array(names, dtype=object), DAYS))
+    df_planning.insert(1, "Jour", np.tile(day_names, W))
+
+    # Summary stats per day, then per week
+    worked = roles > 0
+    daily_h = worked.sum(axis=2)
+    days_on = daily_h > 0
+    first_h = worked.argmax(axis=2)
+    last_h = HOURS_PER_DAY - 1 - worked[:, :, ::-1].argmax(axis=2)
+    # A break exists if the number of worked hours is less than the span of hours
+    coup = (days_on & (daily_h < last_h - first_h + 1)).sum(axis=1)
+    # Length of the OFF streak ending on each day: distance to the last day worked before it
+    day_pos = np.arange(DAYS)
+    last_on = np.maximum.accumulate(np.where(days_on, day_pos, -1), axis=1)
+    off_streak = np.where(days_on, 0, day_pos - last_on)
+    total_h = daily_h.sum(axis=1)
+    days_worked = days_on.sum(axis=1)
+    avg_h = np.round(np.divide(total_h, days_worked, out=np.zeros(W), where=days_worked > 0), 2)
+    df_summary = pd.DataFrame({
+        "Employé": names,
+        "Heures/semaine": total_h,
+        "Jours travaillés": days_worked,
+        "Coupures/semaine": coup,
+        "Jours OFF cons. max": off_streak.max(axis=1, initial=0),
+        "H/jour en moyenne": avg_h
+    })
+
+    return df_planning, df_summary, roles
+
+
+if submitted:
+    # Update session state with the edited data after submission
+    st.session_state.kitchen_df = edited_df
+    st.session_state.role_needs = edited_role_needs
+    df_emp = st.session_state.kitchen_df.fillna(False)
+    role_needs = st.session_state.role_needs
+
+    # Hashable snapshots of the inputs, used as the cache key of build_and_solve
+    emp_tuple = tuple(df_emp[EMP_COLUMNS].itertuples(index=False, name=None))
+    needs_tuple = tuple((r, tuple((d, tuple(role_needs[r][d])) for d in day_names)) for r in ROLES)
+
+    # Re-submitting unchanged inputs re-renders this session's last result directly,
+    # without even going through the build_and_solve cache lookup
+    inputs_hash = hashlib.blake2b(pickle.dumps((emp_tuple, needs_tuple, fast_mode))).hexdigest()
+    if st.session_state.get("last_inputs_hash") == inputs_hash:
+        result = st.session_state.last_result
+    else:
+        with st.spinner("Finding the optimal schedule..."):
+            result = build_and_solve(emp_tuple, needs_tuple, fast_mode, st.session_state.get("last_roles"))
+        st.session_state.last_inputs_hash = inputs_hash
+        st.session_state.last_result = result
 
     # ────────── Display Results ──────────
-    if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+    if result is None:
         st.error("❌ No solution found. Try adjusting employee constraints or staffing needs.")
     else:
         st.success("✅ Schedule generated successfully!")
-
-        # Process the solution to create a readable schedule
-        planning = []
-        summary = []
-        for w in range(W):
-            total_h = days_worked = coup = max_off_streak = curr_off = 0
-            for d in range(DAYS):
-                row = {"Employé": df_emp.iloc[w]['Nom'], "Jour": day_names[d]}
-                work_hours = []
-                for h in range(HOURS_PER_DAY):
-                    role_here = ""
-                    for r in ROLES:
-                        if solver.Value(shifts[(w, r)][idx(d, h)]):
-                            role_here = r
-                    row[hour_labels[h]] = role_here
-                    if role_here:
-                        work_hours.append(h)
-                planning.append(row)
-
-                # Calculate summary stats for the day
-                if work_hours:
-                    days_worked += 1
-                    total_h += len(work_hours)
-                    # A break exists if the number of worked hours is less than the span of hours
-                    if len(work_hours) < (work_hours[-1] - work_hours[0] + 1):
-                        coup += 1
-                    curr_off = 0
-                else:
-                    curr_off += 1
-                    max_off_streak = max(max_off_streak, curr_off)
-
-            avg_h = round(total_h / days_worked, 2) if days_worked else 0
-            summary.append({
-                "Employé": df_emp.iloc[w]['Nom'],
-                "Heures/semaine": total_h,
-                "Jours travaillés": days_worked,
-                "Coupures/semaine": coup,
-                "Jours OFF cons. max": max_off_streak,
-                "H/jour en moyenne": avg_h
-            })
-
-        df_planning = pd.DataFrame(planning)
-        df_summary = pd.DataFrame(summary)
+        df_planning, df_summary, roles = result
+        st.session_state.last_roles = roles  # Reused by the next solve while still valid
 
         st.subheader("🗓️ Weekly Schedule")
         st.dataframe(df_planning.set_index(["Employé", "Jour"]))